@@ -0,0 +1,214 @@
+# Balance subscriber - Solana tells us when a holder's balance moves, so cached verdicts can live long and stay right.
+
+import asyncio
+import itertools
+import json
+import logging
+from collections import OrderedDict
+
+import websockets
+from solana.publickey import PublicKey
+from spl.token.instructions import get_associated_token_address
+
+logger = logging.getLogger("TelegramBotApp.subscriber")
+
+
+class BalanceSubscriber:
+    """Keeps accountSubscribe subscriptions open for verified wallets' token accounts.
+
+    Every balance change is pushed straight into the OwnershipCache with a long TTL. If the socket
+    drops, tracked wallets are invalidated (we may have missed updates) and resubscribed on reconnect.
+    """
+
+    def __init__(self, ws_url, mint, cache, max_subscriptions=1000, subscribed_ttl=3600.0,
+                 commitment="confirmed", reconnect_delay=1.0, max_reconnect_delay=60.0):
+        self.ws_url = ws_url
+        self.mint = mint
+        self.cache = cache
+        self.max_subscriptions = max_subscriptions
+        self.subscribed_ttl = subscribed_ttl
+        self.commitment = commitment
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._wallets = OrderedDict()  # wallet -> token account, oldest first
+        self._subscriptions = {}  # subscription id -> wallet
+        self._wallet_subscriptions = {}  # wallet -> subscription id
+        self._requests = {}  # request id -> wallet, waiting for the subscription id
+        self._ids = itertools.count(1)
+        self._outbox = None
+        self._connected = False
+        self._task = None
+        self._background = set()  # cache invalidations kicked off from sync code
+        self._stats = {"updates": 0, "reconnects": 0, "evicted": 0}
+
+    async def start(self):
+        self._outbox = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Balance subscriber starting against {self.ws_url}. Live balance updates, let's go!")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def track(self, wallet):
+        """Start watching a verified wallet's token account (no-op if we already are)."""
+        if wallet in self._wallets:
+            self._wallets.move_to_end(wallet)
+            return
+        token_account = str(get_associated_token_address(PublicKey(wallet), PublicKey(self.mint)))
+        self._wallets[wallet] = token_account
+        if self._connected:
+            self._subscribe(wallet, token_account)
+        while len(self._wallets) > self.max_subscriptions:
+            oldest, _ = self._wallets.popitem(last=False)
+            self._stats["evicted"] += 1
+            subscription = self._wallet_subscriptions.pop(oldest, None)
+            if subscription is not None:
+                self._subscriptions.pop(subscription, None)
+                if self._connected:
+                    self._send("accountUnsubscribe", [subscription])
+            # Its verdict was cached for subscribed_ttl on the promise of live updates - nobody's listening anymore
+            task = asyncio.get_running_loop().create_task(self.cache.invalidate(oldest))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    def is_tracked(self, wallet) -> bool:
+        return wallet in self._wallet_subscriptions
+
+    def _send(self, method, params):
+        request_id = next(self._ids)
+        self._outbox.put_nowait(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+        return request_id
+
+    def _subscribe(self, wallet, token_account):
+        request_id = self._send("accountSubscribe", [token_account, {"encoding": "jsonParsed", "commitment": self.commitment}])
+        self._requests[request_id] = wallet
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with websockets.connect(self.ws_url, ping_interval=20) as ws:
+                    self._connected = True
+                    delay = self.reconnect_delay
+                    for wallet, token_account in self._wallets.items():
+                        self._subscribe(wallet, token_account)
+                    sender = asyncio.create_task(self._pump_outbox(ws))
+                    try:
+                        async for raw in ws:
+                            await self._handle(json.loads(raw))
+                    finally:
+                        sender.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Balance subscriber connection lost ({e}), reconnecting in {delay:.0f}s.")
+            await self._on_disconnect()
+            self._stats["reconnects"] += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _pump_outbox(self, ws):
+        while True:
+            await ws.send(await self._outbox.get())
+
+    async def _on_disconnect(self):
+        """Anything could have changed while we weren't listening, so make the next check ask the chain."""
+        self._connected = False
+        self._subscriptions.clear()
+        self._wallet_subscriptions.clear()
+        self._requests.clear()
+        self._outbox = asyncio.Queue()
+        for wallet in list(self._wallets):
+            await self.cache.invalidate(wallet)
+
+    async def _handle(self, message):
+        if "id" in message:
+            wallet = self._requests.pop(message["id"], None)
+            if wallet is not None and "result" in message and wallet in self._wallets:
+                self._subscriptions[message["result"]] = wallet
+                self._wallet_subscriptions[wallet] = message["result"]
+            elif "error" in message:
+                logger.error(f"Balance subscription request failed: {message['error']}")
+            return
+        if message.get("method") != "accountNotification":
+            return
+        params = message["params"]
+        wallet = self._subscriptions.get(params["subscription"])
+        if wallet is None:
+            return
+        value = params["result"]["value"]
+        if value is None:
+            amount = 0  # token account got closed
+        else:
+            amount = int(value["data"]["parsed"]["info"]["tokenAmount"]["amount"])
+        self._stats["updates"] += 1
+        if amount > 0:
+            await self.cache.set(wallet, True, ttl=self.subscribed_ttl)
+        else:
+            # We only watch the ATA - an empty one doesn't mean the wallet holds nothing elsewhere, so let the chain decide
+            await self.cache.invalidate(wallet)
+        logger.info(f"Balance update for {wallet}: {amount}. Cache refreshed in real time.")
+
+    def metrics(self) -> dict:
+        return {
+            "connected": self._connected,
+            "tracked_wallets": len(self._wallets),
+            "active_subscriptions": len(self._subscriptions),
+            **self._stats,
+        }
+
+
+if __name__ == "__main__":
+    # Self-test against a local stand-in for the Solana websocket: python balance_subscriber.py
+    from ownership_cache import OwnershipCache
+
+    MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+    WALLETS = ["9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM", "4Nd1mBQtrMJVYVfKf2PJy9NZUZdTAsp7D4xWLs4gDB4T"]
+
+    async def fake_validator(ws, path=None):
+        """Acks every accountSubscribe and pushes one balance update for it."""
+        subscription_ids = itertools.count(100)
+        async for raw in ws:
+            request = json.loads(raw)
+            if request["method"] != "accountSubscribe":
+                continue
+            subscription = next(subscription_ids)
+            await ws.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": subscription}))
+            await ws.send(json.dumps({"jsonrpc": "2.0", "method": "accountNotification", "params": {
+                "subscription": subscription,
+                "result": {"value": {"data": {"parsed": {"info": {"tokenAmount": {"amount": "5"}}}}}},
+            }}))
+
+    async def wait_until(condition, timeout=2.0):
+        for _ in range(int(timeout / 0.01)):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("timed out waiting for the subscriber")
+
+    async def main():
+        async with websockets.serve(fake_validator, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            cache = OwnershipCache(positive_ttl=300.0)
+            subscriber = BalanceSubscriber(f"ws://127.0.0.1:{port}", MINT, cache, max_subscriptions=1, subscribed_ttl=3600.0)
+            await subscriber.start()
+            await wait_until(lambda: subscriber._connected)
+
+            subscriber.track(WALLETS[0])
+            await wait_until(lambda: subscriber.is_tracked(WALLETS[0]) and subscriber.metrics()["updates"] == 1)
+            assert await cache.get(WALLETS[0]) is True, "balance push should land in the cache"
+
+            # Only room for one subscription, so the first wallet gets evicted and must lose its long-lived verdict
+            subscriber.track(WALLETS[1])
+            await wait_until(lambda: subscriber.is_tracked(WALLETS[1]) and subscriber.metrics()["updates"] == 2)
+            assert not subscriber.is_tracked(WALLETS[0])
+            assert await cache.get(WALLETS[0]) is None, "evicted wallet's verdict should be gone"
+            assert await cache.get(WALLETS[1]) is True
+
+            await subscriber.stop()
+            print("balance subscriber self-test passed:", subscriber.metrics())
+
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+# Per-chat execution lanes - different chats party in parallel, but each chat gets its answers in order.
+
+import logging
+from collections import deque
+
+logger = logging.getLogger("TelegramBotApp.lanes")
+
+
+class ChatLaneScheduler:
+    """Serializes jobs per key (chat_id) while letting different keys run concurrently.
+
+    A lane only exists while its chat has work in flight: the first job for a chat opens the lane and
+    runs inline, jobs arriving meanwhile queue up behind it, and whoever holds the lane drains them
+    before deleting it. Idle chats cost nothing, so memory tracks active chats, not total chats.
+    """
+
+    def __init__(self, max_backlog=50):
+        self.max_backlog = max_backlog
+        self._lanes = {}
+        self._stats = {
+            "deferred": 0,
+            "dropped": 0,
+            "failed": 0,
+            "max_backlog_seen": 0,
+            "max_active_lanes": 0,
+        }
+
+    async def run(self, key, job):
+        """Run a zero-arg coroutine function in the lane for key, after anything already queued there."""
+        lane = self._lanes.get(key)
+        if lane is not None:
+            if len(lane) >= self.max_backlog:
+                self._stats["dropped"] += 1
+                logger.warning(f"Lane for chat {key} already has {len(lane)} jobs waiting, dropping this one. Chill, fam.")
+                return
+            lane.append(job)
+            self._stats["deferred"] += 1
+            self._stats["max_backlog_seen"] = max(self._stats["max_backlog_seen"], len(lane))
+            return
+
+        lane = self._lanes[key] = deque()
+        self._stats["max_active_lanes"] = max(self._stats["max_active_lanes"], len(self._lanes))
+        try:
+            while True:
+                try:
+                    await job()
+                except Exception as e:
+                    self._stats["failed"] += 1
+                    logger.exception(f"Job in lane for chat {key} failed: {e}")
+                if not lane:
+                    break
+                job = lane.popleft()
+        finally:
+            if lane:
+                logger.warning(f"Lane for chat {key} closed with {len(lane)} jobs still waiting.")
+            del self._lanes[key]
+
+    def is_idle(self, key) -> bool:
+        """True when nothing is running or waiting for this chat."""
+        return key not in self._lanes
+
+    def metrics(self) -> dict:
+        """Snapshot of lane counters."""
+        return {
+            "active_lanes": len(self._lanes),
+            "queued_in_lanes": sum(len(lane) for lane in self._lanes.values()),
+            **self._stats,
+        }
@@ -0,0 +1,65 @@
+# Async Mongo data layer - every DB round-trip gets awaited, so one slow query doesn't freeze every chat.
+
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger("TelegramBotApp.data")
+
+CACHE_TTL_INDEX = "cached_at_ttl"
+INDEX_OPTIONS_CONFLICT = 85  # Mongo error code when an index exists with different options
+
+
+def response_cache_key(message, persona, model_id) -> str:
+    """Fixed-size key for a cached Grok answer, so we index 64 hex chars instead of whole messages."""
+    return hashlib.sha256(f"{model_id}\0{persona}\0{message}".encode()).hexdigest()
+
+
+class DataLayer:
+    """All Mongo access for the bot, on motor so handlers await the DB instead of blocking the loop."""
+
+    def __init__(self, mongo_uri, db_name="bot_db", cache_ttl_seconds=60):
+        self.client = AsyncIOMotorClient(mongo_uri)
+        self.db = self.client[db_name]
+        self.cache = self.db['cache']  # Here we store all the cool responses, so we don't have to keep asking Grok, like, all the time
+        self.file_ids = self.db['file_ids']  # Uploaded hippos' Telegram file_ids per prompt combo, re-served when the pool runs dry
+        self.wallet_ownership = self.db['wallet_ownership']  # Cached token-gating verdicts, expired by a TTL index
+        self.cache_ttl_seconds = int(cache_ttl_seconds)
+
+    async def ensure_indexes(self):
+        """Indexing for performance - because even databases need their smoothie."""
+        # Cache docs are keyed by _id = response_cache_key(...), so the only extra index is the TTL one
+        try:
+            await self.cache.create_index("cached_at", name=CACHE_TTL_INDEX, expireAfterSeconds=self.cache_ttl_seconds)
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            # TTL changed since the index was built, just retune it in place
+            await self.db.command("collMod", self.cache.name, index={"name": CACHE_TTL_INDEX, "expireAfterSeconds": self.cache_ttl_seconds})
+        logger.info("Mongo indexes are in place.")
+
+    def close(self):
+        self.client.close()
+
+    # Response cache
+    async def find_cached_response(self, message, persona, model_id, max_age_seconds):
+        """Cached Grok response for this question that's younger than max_age_seconds, or None."""
+        # The TTL monitor only sweeps about once a minute, so still filter on age here
+        return await self.cache.find_one(
+            {
+                "_id": response_cache_key(message, persona, model_id),
+                "cached_at": {"$gte": datetime.utcnow() - timedelta(seconds=max_age_seconds)},
+            },
+            {"response": 1, "cached_at": 1},
+        )
+
+    async def cache_response(self, message, persona, model_id, response):
+        """Store (or refresh) the one cached answer for this question."""
+        await self.cache.update_one(
+            {"_id": response_cache_key(message, persona, model_id)},
+            {"$set": {"response": response, "cached_at": datetime.utcnow()}},
+            upsert=True,
+        )
@@ -0,0 +1,67 @@
+# Update dedup - Telegram redelivers when it gets impatient, we answer (and pay Grok) only once.
+
+import logging
+from collections import deque
+
+logger = logging.getLogger("TelegramBotApp.dedup")
+
+
+class UpdateDeduplicator:
+    """Remembers recent update_ids in a bounded ring, optionally backed by a shared store for multi-worker setups.
+
+    The shared store is any shared_state backend: claiming an update is just taking a lock named after
+    it and never releasing it, so the lock's TTL doubles as the dedup window across workers.
+    """
+
+    def __init__(self, window=10000, shared_backend=None, shared_ttl=3600.0):
+        self.window = window
+        self.shared_backend = shared_backend
+        self.shared_ttl = shared_ttl
+        self._ring = deque()
+        self._seen = set()
+        self._claims = {}  # update_id -> shared lock token, so a refused update can be given back
+        self._stats = {"checked": 0, "duplicates_local": 0, "duplicates_shared": 0, "shared_errors": 0}
+
+    async def is_duplicate(self, update_id) -> bool:
+        """True if this update_id was already taken by us or (with a shared store) another worker."""
+        self._stats["checked"] += 1
+        if update_id in self._seen:
+            self._stats["duplicates_local"] += 1
+            return True
+        self._remember(update_id)
+        if self.shared_backend is None:
+            return False
+        try:
+            claimed = await self.shared_backend.acquire_lock(f"update:{update_id}", self.shared_ttl)
+        except Exception as e:
+            # Fail open - a duplicate answer beats a dropped one
+            self._stats["shared_errors"] += 1
+            logger.error(f"Shared dedup check failed for update {update_id}: {e}")
+            return False
+        if claimed is None:
+            self._stats["duplicates_shared"] += 1
+            return True
+        self._claims[update_id] = claimed
+        return False
+
+    async def forget(self, update_id):
+        """Un-see an update we took but couldn't process, so Telegram's redelivery gets through."""
+        self._seen.discard(update_id)
+        token = self._claims.pop(update_id, None)
+        if token is not None:
+            try:
+                await self.shared_backend.release_lock(f"update:{update_id}", token)
+            except Exception as e:
+                self._stats["shared_errors"] += 1
+                logger.error(f"Couldn't release dedup claim for update {update_id}: {e}")
+
+    def _remember(self, update_id):
+        self._ring.append(update_id)
+        self._seen.add(update_id)
+        if len(self._ring) > self.window:
+            oldest = self._ring.popleft()
+            self._seen.discard(oldest)
+            self._claims.pop(oldest, None)
+
+    def metrics(self) -> dict:
+        return {"window_entries": len(self._ring), "shared": self.shared_backend is not None, **self._stats}
@@ -0,0 +1,80 @@
+# Fast update routing - peek at the three fields we care about and skip building Update objects nobody will use.
+
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import orjson
+from telegram import Update
+
+
+@dataclass
+class RoutedUpdate:
+    """The bits of a Telegram update the handlers actually use, with the full Update built only on demand."""
+    update_id: Optional[int]
+    chat_id: int
+    text: str
+    raw: dict
+    bot: Any = None
+    _update: Optional[Update] = field(default=None, repr=False)
+
+    @property
+    def telegram_update(self) -> Update:
+        if self._update is None:
+            self._update = Update.de_json(self.raw, self.bot)
+        return self._update
+
+
+def parse_update(body: bytes) -> dict:
+    """Raw webhook body -> dict, via orjson."""
+    return orjson.loads(body)
+
+
+def route_update(update: dict, bot=None) -> Optional[RoutedUpdate]:
+    """A RoutedUpdate for plain text messages, None for everything we ignore (edits, joins, callbacks, ...)."""
+    # Malformed bodies get ignored rather than 500'd - a 500 just makes Telegram redeliver the same junk forever
+    if not isinstance(update, dict):
+        return None
+    message = update.get("message")
+    if not isinstance(message, dict):
+        return None
+    text = message.get("text")
+    chat = message.get("chat")
+    if not text or not isinstance(text, str) or not isinstance(chat, dict) or not isinstance(chat.get("id"), int):
+        return None
+    return RoutedUpdate(update_id=update.get("update_id"), chat_id=chat["id"], text=text, raw=update, bot=bot)
+
+
+if __name__ == "__main__":
+    # Micro-benchmark of webhook parsing, old path vs fast path: python fast_updates.py
+    import json
+    import timeit
+
+    text_update = {
+        "update_id": 123456789,
+        "message": {
+            "message_id": 42,
+            "from": {"id": 1111, "is_bot": False, "first_name": "Chibi", "username": "chibi_fan", "language_code": "en"},
+            "chat": {"id": 1111, "first_name": "Chibi", "username": "chibi_fan", "type": "private"},
+            "date": 1733300000,
+            "text": "gm! what's the vibe today?",
+        },
+    }
+    edit_update = {"update_id": 123456790, "edited_message": text_update["message"]}
+    samples = {"text message": orjson.dumps(text_update), "edited message (ignored)": orjson.dumps(edit_update)}
+
+    def old_path(body):
+        update = json.loads(body)
+        json.dumps(update, indent=2)  # the old "log the whole update" line
+        telegram_update = Update.de_json(update, None)
+        if telegram_update.message and telegram_update.message.text:
+            return telegram_update.message.chat_id
+
+    def fast_path(body):
+        routed = route_update(parse_update(body))
+        return routed.chat_id if routed else None
+
+    runs = 20000
+    for name, body in samples.items():
+        old = runs / timeit.timeit(lambda: old_path(body), number=runs)
+        fast = runs / timeit.timeit(lambda: fast_path(body), number=runs)
+        print(f"{name:26s} before: {old:10,.0f} updates/s   after: {fast:10,.0f} updates/s   ({fast / old:.1f}x)")
@@ -0,0 +1,72 @@
+# Telegram file_id cache - upload a hippo once, then just point Telegram at the copy it already has.
+
+import logging
+import random
+from datetime import datetime
+
+logger = logging.getLogger("TelegramBotApp.file_ids")
+
+
+class FileIdCache:
+    """Uploaded hippos per prompt combo, by Telegram file_id, so an empty pool can re-serve one instead of rendering.
+
+    Every render is unique, so there's no point keying by content - what repeats is the combo. Each combo keeps
+    up to max_per_combo file_ids in memory, backed by an async (motor) Mongo collection that expires entries
+    after ttl seconds, so the collection can't grow without bound.
+    """
+
+    def __init__(self, collection, max_per_combo=20, ttl=30 * 24 * 3600):
+        self.collection = collection
+        self.max_per_combo = max_per_combo
+        self.ttl = ttl
+        self._memory = {}  # combo key -> list of file_ids, loaded from Mongo on first use
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "forgotten": 0}
+
+    @staticmethod
+    def combo_key(combo) -> str:
+        return ":".join(combo)
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("uploaded_at", expireAfterSeconds=int(self.ttl))
+        await self.collection.create_index("combo")
+
+    async def _file_ids(self, key):
+        file_ids = self._memory.get(key)
+        if file_ids is None:
+            cursor = self.collection.find({"combo": key}, {"_id": 1}).sort("uploaded_at", -1).limit(self.max_per_combo)
+            file_ids = self._memory[key] = [doc["_id"] async for doc in cursor]
+        return file_ids
+
+    async def pick(self, combo):
+        """A random already-uploaded file_id for this combo, or None if we've never sent one."""
+        file_ids = await self._file_ids(self.combo_key(combo))
+        if not file_ids:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return random.choice(file_ids)
+
+    async def put(self, combo, file_id):
+        """Record the file_id Telegram handed back after an upload."""
+        key = self.combo_key(combo)
+        file_ids = await self._file_ids(key)
+        if file_id not in file_ids:
+            file_ids.append(file_id)
+            del file_ids[:-self.max_per_combo]  # newest ones win
+        await self.collection.update_one(
+            {"_id": file_id},
+            {"$set": {"combo": key, "uploaded_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        self._stats["stored"] += 1
+
+    async def forget(self, combo, file_id):
+        """Drop a file_id Telegram no longer accepts."""
+        file_ids = self._memory.get(self.combo_key(combo))
+        if file_ids and file_id in file_ids:
+            file_ids.remove(file_id)
+        await self.collection.delete_one({"_id": file_id})
+        self._stats["forgotten"] += 1
+
+    def metrics(self) -> dict:
+        return {"cached_file_ids": sum(len(file_ids) for file_ids in self._memory.values()), **self._stats}
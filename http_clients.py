@@ -0,0 +1,72 @@
+# Shared HTTP clients - one pooled, keep-alive connection pool per upstream so we stop shaking hands with everyone on every request.
+
+import logging
+from dataclasses import dataclass
+
+import httpx
+
+logger = logging.getLogger("TelegramBotApp.http")
+
+
+@dataclass
+class UpstreamConfig:
+    """Connection pool settings for a single upstream service."""
+    name: str
+    base_url: str = ""
+    timeout: float = 60.0
+    connect_timeout: float = 10.0
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 60.0
+    http2: bool = True
+
+
+class HttpClientRegistry:
+    """Process-wide registry of pooled httpx.AsyncClient instances, one per upstream."""
+
+    def __init__(self):
+        self._configs = {}
+        self._clients = {}
+
+    def register(self, config: UpstreamConfig):
+        """Declare an upstream. Clients are only built once start() runs inside the event loop."""
+        if config.name in self._clients:
+            raise RuntimeError(f"Upstream '{config.name}' is already running, register it before start().")
+        self._configs[config.name] = config
+
+    async def start(self):
+        """Build one pooled client per registered upstream."""
+        for name, config in self._configs.items():
+            if name in self._clients:
+                continue
+            self._clients[name] = httpx.AsyncClient(
+                base_url=config.base_url,
+                http2=config.http2,
+                timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=config.max_connections,
+                    max_keepalive_connections=config.max_keepalive_connections,
+                    keepalive_expiry=config.keepalive_expiry,
+                ),
+            )
+            logger.info(
+                f"HTTP pool for '{name}' ready (http2={config.http2}, max_connections={config.max_connections}, "
+                f"keepalive={config.max_keepalive_connections}). Handshakes are so last season."
+            )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Grab the pooled client for an upstream."""
+        try:
+            return self._clients[name]
+        except KeyError:
+            raise RuntimeError(f"HTTP client '{name}' is not running. Did lifespan forget to call start()?") from None
+
+    async def close(self):
+        """Close every pooled client, releasing their keep-alive connections."""
+        clients, self._clients = self._clients, {}
+        for name, client in clients.items():
+            try:
+                await client.aclose()
+                logger.info(f"HTTP pool for '{name}' closed.")
+            except Exception as e:
+                logger.error(f"Error closing HTTP pool for '{name}': {e}")
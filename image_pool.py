@@ -0,0 +1,122 @@
+# Pre-rendered robo-hippo pool - why wait for diffusion when there's a fresh hippo already on the shelf?
+
+import asyncio
+import logging
+import random
+from collections import Counter, deque
+
+logger = logging.getLogger("TelegramBotApp.image_pool")
+
+# How the refill loop decides which combo to render next
+REFILL_EMPTIEST = "emptiest"  # whichever combo has the fewest images in stock
+REFILL_DEMAND = "demand"  # weight missing slots by how often the combo gets served
+REFILL_ROUND_ROBIN = "round_robin"  # take turns, no favourites
+REFILL_PRIORITIES = (REFILL_EMPTIEST, REFILL_DEMAND, REFILL_ROUND_ROBIN)
+
+
+class ImagePool:
+    """Keeps up to `size` pre-rendered variants per prompt combo and tops them up while the renderer is idle."""
+
+    def __init__(self, worker, render_prompt, combos, size=2, refill_priority=REFILL_EMPTIEST, idle_interval=2.0):
+        if refill_priority not in REFILL_PRIORITIES:
+            raise ValueError(f"Unknown refill priority '{refill_priority}', pick one of {REFILL_PRIORITIES}")
+        self.worker = worker  # InferenceWorker, anything with .pending and async .generate(prompt, seed)
+        self.render_prompt = render_prompt  # (rarity, accessory) -> prompt
+        self.combos = list(combos)
+        self.size = size
+        self.refill_priority = refill_priority
+        self.idle_interval = idle_interval
+        self._stock = {combo: deque() for combo in self.combos}  # combo -> deque of (seed, png bytes)
+        self._demand = Counter()
+        self._next_round_robin = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._stats = {"hits": 0, "misses": 0, "rendered": 0, "render_failures": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def start(self):
+        """Kick off the background refill loop."""
+        if not self.enabled:
+            logger.info("Image pool disabled (size=0). Every hippo will be made to order.")
+            return
+        self._task = asyncio.create_task(self._refill_loop())
+        logger.info(f"Image pool started: {self.size} variants x {len(self.combos)} combos, refill by {self.refill_priority}.")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def take(self, combo):
+        """Pop a ready image for combo, or None if the shelf is empty."""
+        self._demand[combo] += 1
+        stock = self._stock.get(combo)
+        self._wakeup.set()
+        if not stock:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        _, image = stock.popleft()
+        return image
+
+    def _next_combo(self):
+        missing = [combo for combo in self.combos if len(self._stock[combo]) < self.size]
+        if not missing:
+            return None
+        if self.refill_priority == REFILL_ROUND_ROBIN:
+            for _ in range(len(self.combos)):
+                combo = self.combos[self._next_round_robin % len(self.combos)]
+                self._next_round_robin += 1
+                if combo in missing:
+                    return combo
+        if self.refill_priority == REFILL_DEMAND:
+            return max(missing, key=lambda c: ((self.size - len(self._stock[c])) * (1 + self._demand[c]), -len(self._stock[c])))
+        return min(missing, key=lambda c: len(self._stock[c]))
+
+    def _fresh_seed(self, combo):
+        """Pick a seed this combo doesn't already have on the shelf, so variants actually vary."""
+        taken = {seed for seed, _ in self._stock[combo]}
+        while True:
+            seed = random.getrandbits(32)
+            if seed not in taken:
+                return seed
+
+    async def _refill_loop(self):
+        while True:
+            combo = self._next_combo()
+            if combo is None:
+                # Shelves are full, nap until somebody takes an image
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self.worker.pending:
+                # Real users first, only render when the renderer is idle
+                await asyncio.sleep(self.idle_interval)
+                continue
+            seed = self._fresh_seed(combo)
+            try:
+                image = await self.worker.generate(self.render_prompt(*combo), seed=seed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["render_failures"] += 1
+                logger.error(f"Image pool failed to render {combo}: {e}. Backing off.")
+                await asyncio.sleep(self.idle_interval * 5)
+                continue
+            self._stock[combo].append((seed, image))
+            self._stats["rendered"] += 1
+            logger.debug(f"Image pool stocked {combo} (seed={seed}), now {len(self._stock[combo])}/{self.size}.")
+
+    def metrics(self) -> dict:
+        """Snapshot of pool stock and hit rate."""
+        return {
+            "size": self.size,
+            "refill_priority": self.refill_priority,
+            "stocked": sum(len(stock) for stock in self._stock.values()),
+            "capacity": self.size * len(self.combos),
+            **self._stats,
+        }
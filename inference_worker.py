@@ -0,0 +1,240 @@
+# Flux inference worker - the diffusion model lives in its own process so the event loop never has to sit through a render.
+
+import asyncio
+import io
+import itertools
+import logging
+import multiprocessing
+import threading
+
+logger = logging.getLogger("TelegramBotApp.inference")
+
+DEFAULT_MODEL_ID = "black-forest-labs/FLUX.1-schnell"
+NUM_INFERENCE_STEPS = 4  # schnell is distilled for 4 steps
+
+# Stages reported to generate()'s on_progress callback
+STAGE_QUEUED = "queued"  # detail: number of renders ahead of this one
+STAGE_RENDERING = "rendering"  # detail: (step, total_steps)
+
+
+def _worker_main(model_id, job_queue, result_queue):
+    """Entry point of the inference process: load FluxPipeline once, then render jobs until told to stop."""
+    try:
+        import torch
+        from diffusers import FluxPipeline
+
+        pipeline = FluxPipeline.from_pretrained(model_id, torch_dtype=torch.bfloat16)
+        pipeline.enable_model_cpu_offload()  # For memory efficiency
+    except Exception as e:
+        result_queue.put(("fatal", None, f"{type(e).__name__}: {e}"))
+        return
+    result_queue.put(("ready", None, None))
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, prompt, seed = job
+        result_queue.put(("started", job_id, None))
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            result_queue.put(("progress", job_id, (step + 1, NUM_INFERENCE_STEPS)))
+            return callback_kwargs
+
+        try:
+            generator = torch.Generator("cpu").manual_seed(seed) if seed is not None else None
+            image = pipeline(
+                prompt=prompt,
+                guidance_scale=0.0,  # Required for FLUX.1-schnell
+                height=512,  # Adjust based on your needs and available VRAM
+                width=512,
+                num_inference_steps=NUM_INFERENCE_STEPS,
+                max_sequence_length=256,  # Required for FLUX.1-schnell
+                generator=generator,
+                callback_on_step_end=on_step_end,
+            ).images[0]
+            # Convert the image to bytes for Telegram
+            img_byte_arr = io.BytesIO()
+            image.save(img_byte_arr, format='PNG')
+            result_queue.put(("done", job_id, img_byte_arr.getvalue()))
+        except Exception as e:
+            result_queue.put(("error", job_id, f"{type(e).__name__}: {e}"))
+
+
+class InferenceError(Exception):
+    """Raised when the inference process couldn't render an image."""
+
+
+class InferenceWorkerDown(InferenceError):
+    """Raised when there's no inference process to render with (not started, died, crashed or stopped)."""
+
+
+class InferenceWorker:
+    """Owns the inference process and lets async code await renders without blocking the loop.
+
+    A watchdog checks on the process every watchdog_interval seconds. If it died (OOM, segfault, failed
+    model load), waiting renders fail right away instead of sitting out their timeout, and a fresh
+    process is spawned, backing off up to max_restart_delay if it keeps dying.
+    """
+
+    def __init__(self, model_id=DEFAULT_MODEL_ID, timeout=600.0, watchdog_interval=1.0, restart_delay=1.0, max_restart_delay=60.0):
+        self.model_id = model_id
+        self.timeout = timeout
+        self.watchdog_interval = watchdog_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self._ctx = multiprocessing.get_context("spawn")  # fresh interpreter, no forked event loop or CUDA state
+        self._process = None
+        self._job_queue = None
+        self._result_queue = None
+        self._reader = None
+        self._watchdog = None
+        self._backoff = restart_delay
+        self._loop = None
+        self._pending = {}
+        self._waiting = []  # job ids sent to the process but not picked up yet, in queue order
+        self._progress = {}  # job_id -> on_progress callback
+        self._job_ids = itertools.count(1)
+        self._stats = {"completed": 0, "failed": 0, "restarts": 0}
+
+    async def start(self):
+        """Launch the inference process, the thread that ferries results back to the event loop, and the watchdog."""
+        self._loop = asyncio.get_running_loop()
+        self._spawn()
+        self._watchdog = asyncio.create_task(self._watch())
+
+    def _spawn(self):
+        # Fresh queues every time - a process that died mid-put can leave the old ones in a sorry state
+        self._job_queue = self._ctx.Queue()
+        self._result_queue = self._ctx.Queue()
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.model_id, self._job_queue, self._result_queue),
+            name="flux-inference",
+            daemon=True,
+        )
+        self._process.start()
+        self._reader = threading.Thread(target=self._read_results, args=(self._result_queue,), name="flux-results", daemon=True)
+        self._reader.start()
+        logger.info(f"Inference worker process started (pid={self._process.pid}, model={self.model_id}). Robo-hippo factory is warming up!")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watchdog_interval)
+            if self._process.is_alive():
+                continue
+            exitcode = self._process.exitcode
+            self._stats["restarts"] += 1
+            logger.error(f"Inference worker died (exit code {exitcode}), restarting in {self._backoff:.0f}s.")
+            self._result_queue.put(("stop", None, None))  # retire the old reader thread
+            self._fail_pending(f"Inference worker died (exit code {exitcode})")
+            self._waiting.clear()
+            await asyncio.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, self.max_restart_delay)
+            self._spawn()
+
+    async def stop(self, join_timeout=10.0):
+        """Ask the inference process to finish up, and pull the plug if it won't."""
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            await asyncio.gather(self._watchdog, return_exceptions=True)
+            self._watchdog = None
+        if self._process is None:
+            return
+        self._job_queue.put(None)
+        await asyncio.get_running_loop().run_in_executor(None, self._process.join, join_timeout)
+        if self._process.is_alive():
+            logger.warning("Inference worker didn't stop in time, terminating it.")
+            self._process.terminate()
+        self._result_queue.put(("stop", None, None))
+        self._fail_pending("Inference worker stopped")
+        self._process = None
+        logger.info("Inference worker stopped.")
+
+    @property
+    def pending(self) -> int:
+        """Number of renders queued or running."""
+        return len(self._pending)
+
+    async def generate(self, prompt, seed=None, on_progress=None) -> bytes:
+        """Render a prompt in the inference process and return the PNG bytes.
+
+        on_progress(stage, detail) is called on the event loop as the job waits its turn and renders.
+        """
+        if self._process is None or not self._process.is_alive():
+            raise InferenceWorkerDown("Inference worker is not running")
+        job_id = next(self._job_ids)
+        future = self._loop.create_future()
+        self._pending[job_id] = future
+        self._waiting.append(job_id)
+        if on_progress is not None:
+            self._progress[job_id] = on_progress
+            self._report(job_id, STAGE_QUEUED, len(self._waiting) - 1)
+        self._job_queue.put((job_id, prompt, seed))
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        finally:
+            self._pending.pop(job_id, None)
+            self._progress.pop(job_id, None)
+            if job_id in self._waiting:
+                self._waiting.remove(job_id)
+
+    def _read_results(self, result_queue):
+        while True:
+            kind, job_id, payload = result_queue.get()
+            if kind == "stop":
+                return
+            self._loop.call_soon_threadsafe(self._dispatch, kind, job_id, payload)
+
+    def _dispatch(self, kind, job_id, payload):
+        if kind == "ready":
+            logger.info("Flux pipeline loaded in the inference worker. Ready to render!")
+            self._backoff = self.restart_delay  # it made it, so the next crash starts the backoff over
+            return
+        if kind == "fatal":
+            logger.error(f"Inference worker failed to load the Flux pipeline: {payload}")
+            self._fail_pending(f"Inference worker crashed: {payload}")
+            return
+        if kind == "started":
+            if job_id in self._waiting:
+                self._waiting.remove(job_id)
+            # Everyone behind it just moved up a spot
+            for position, waiting_id in enumerate(self._waiting):
+                self._report(waiting_id, STAGE_QUEUED, position)
+            self._report(job_id, STAGE_RENDERING, (0, NUM_INFERENCE_STEPS))
+            return
+        if kind == "progress":
+            self._report(job_id, STAGE_RENDERING, payload)
+            return
+        future = self._pending.get(job_id)
+        if future is None or future.done():
+            return  # caller timed out or gave up, nobody's waiting for this one
+        if kind == "done":
+            self._stats["completed"] += 1
+            future.set_result(payload)
+        else:
+            self._stats["failed"] += 1
+            future.set_exception(InferenceError(payload))
+
+    def _report(self, job_id, stage, detail):
+        callback = self._progress.get(job_id)
+        if callback is None:
+            return
+        try:
+            callback(stage, detail)
+        except Exception as e:
+            logger.warning(f"Progress callback for render {job_id} blew up: {e}")
+
+    def _fail_pending(self, reason):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(InferenceWorkerDown(reason))
+
+    def metrics(self) -> dict:
+        """Snapshot of the inference worker's state."""
+        return {
+            "alive": self._process is not None and self._process.is_alive(),
+            "pending": self.pending,
+            "waiting": len(self._waiting),
+            **self._stats,
+        }
@@ -0,0 +1,130 @@
+# Logging pipeline - records get queued in the hot path and formatted/written on a background thread, as JSON.
+
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+import orjson
+
+# Everything a LogRecord carries by default - whatever else is on it came in via extra={...}
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_stats = {"enqueued": 0, "dropped_full": 0, "sampled_out": 0, "truncated": 0}
+
+
+def truncate(value, max_length):
+    """Clip long strings so one giant payload can't flood the logs."""
+    if max_length and len(value) > max_length:
+        _stats["truncated"] += 1
+        return f"{value[:max_length]}... [{len(value) - max_length} more chars]"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, any extra={...} fields, and exc when there is one."""
+
+    def __init__(self, max_field_length=2000):
+        super().__init__()
+        self.max_field_length = max_field_length
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),  # already clipped by the queue handler
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = truncate(value, self.max_field_length) if isinstance(value, str) else value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of the chatty records, per logger. Warnings and up always get through."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)  # logger name -> fraction of records to keep
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        if rate is None or rate >= 1.0 or random.random() < rate:
+            return True
+        _stats["sampled_out"] += 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without ever blocking, and leaves the JSON work to that thread."""
+
+    def __init__(self, log_queue, max_field_length=2000):
+        super().__init__(log_queue)
+        self.max_field_length = max_field_length
+
+    def prepare(self, record):
+        # Only the cheap part happens here: freeze the message (args can be mutable) and render any traceback.
+        # The JSON/text formatting is the listener thread's problem.
+        record.msg = truncate(record.getMessage(), self.max_field_length)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            _stats["enqueued"] += 1
+        except queue.Full:
+            _stats["dropped_full"] += 1  # better a missing line than a stalled event loop
+
+
+def parse_pairs(spec, cast):
+    """'a=1,b=2' -> {'a': cast('1'), 'b': cast('2')}, for the per-logger env settings."""
+    pairs = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            pairs[name.strip()] = cast(value.strip())
+    return pairs
+
+
+def configure_logging(level="INFO", levels=None, sampling=None, json_output=True, max_field_length=2000, queue_size=10000):
+    """Route all logging through a bounded queue to a background writer. Returns the started QueueListener.
+
+    levels maps logger names to their own level (e.g. {"httpx": "WARNING"}), sampling maps logger names
+    to the fraction of their DEBUG/INFO records to keep.
+    """
+    log_queue = queue.Queue(maxsize=queue_size)
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter(max_field_length) if json_output else logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = NonBlockingQueueHandler(log_queue, max_field_length)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def logging_metrics() -> dict:
+    return dict(_stats)
@@ -0,0 +1,56 @@
+# migrate_cache.py
+# One-shot migration of the Grok response cache to hashed keys + TTL expiry. Safe to run more than once.
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from data_layer import response_cache_key, CACHE_TTL_INDEX
+
+# Load environment variables - same .env as the bot, so we migrate the database it actually uses
+load_dotenv()
+MONGO_URI = os.getenv('MONGO_URI')
+CACHE_TTL = int(float(os.getenv('GROK_CACHE_TTL', 60)))
+LEGACY_INDEX = "message_1_persona_1_cached_at_-1"
+BATCH_SIZE = 1000
+
+def migrate_cache():
+    """Rekey still-fresh legacy cache docs, delete the rest, and swap the raw-text index for a TTL index."""
+    cache = MongoClient(MONGO_URI)['bot_db']['cache']
+
+    # Legacy docs have an ObjectId _id and the raw message text; only ones inside the TTL window are worth keeping
+    cutoff = datetime.utcnow() - timedelta(seconds=CACHE_TTL)
+    legacy = cache.find({"message": {"$exists": True}, "cached_at": {"$gte": cutoff}}).sort("cached_at", 1)
+    ops, rekeyed = [], 0
+    for doc in legacy:
+        key = response_cache_key(doc["message"], doc.get("persona", "Chibi"), doc.get("model", "grok-beta"))
+        # Oldest first, so the newest answer for a question wins
+        ops.append(UpdateOne({"_id": key}, {"$set": {"response": doc["response"], "cached_at": doc["cached_at"]}}, upsert=True))
+        if len(ops) >= BATCH_SIZE:
+            rekeyed += cache.bulk_write(ops, ordered=True).upserted_count
+            ops = []
+    if ops:
+        rekeyed += cache.bulk_write(ops, ordered=True).upserted_count
+    print(f"Rekeyed {rekeyed} fresh cache entries.")
+
+    deleted = cache.delete_many({"message": {"$exists": True}}).deleted_count
+    print(f"Deleted {deleted} legacy cache documents.")
+
+    if LEGACY_INDEX in cache.index_information():
+        cache.drop_index(LEGACY_INDEX)
+        print(f"Dropped legacy index {LEGACY_INDEX}.")
+
+    if CACHE_TTL_INDEX in cache.index_information():
+        cache.database.command("collMod", cache.name, index={"name": CACHE_TTL_INDEX, "expireAfterSeconds": CACHE_TTL})
+    else:
+        cache.create_index("cached_at", name=CACHE_TTL_INDEX, expireAfterSeconds=CACHE_TTL)
+    print(f"TTL index {CACHE_TTL_INDEX} expires entries after {CACHE_TTL}s.")
+
+if __name__ == '__main__':
+    if not MONGO_URI:
+        # MongoClient(None) would quietly go for localhost - not the place to run a migration by accident
+        sys.exit("MONGO_URI is not set, refusing to guess which database to migrate.")
+    migrate_cache()
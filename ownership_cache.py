@@ -0,0 +1,62 @@
+# Wallet ownership cache - balances don't change every second, so neither should our RPC bill.
+
+import logging
+from datetime import datetime, timedelta
+
+from ttl_cache import TTLCache
+
+logger = logging.getLogger("TelegramBotApp.ownership")
+
+
+class OwnershipCache:
+    """Caches token-gating verdicts per wallet, with separate TTLs for "holds tokens" and "doesn't".
+
+    Lookups hit an in-process TTLCache first; with a (motor) collection configured, verdicts are also
+    persisted with an expires_at so they survive restarts and get cleaned up by a Mongo TTL index.
+    """
+
+    def __init__(self, positive_ttl=300.0, negative_ttl=30.0, maxsize=100000, max_bytes=32 * 1024 * 1024, collection=None):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.collection = collection
+        self._memory = TTLCache(maxsize=maxsize, max_bytes=max_bytes, ttl=positive_ttl)
+        self._stats = {"persisted_hits": 0, "invalidations": 0}
+
+    async def ensure_indexes(self):
+        if self.collection is not None:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def get(self, wallet):
+        """Cached verdict for the wallet: True, False, or None when we have to ask the chain."""
+        owns = self._memory.get(wallet)
+        if owns is not None or self.collection is None:
+            return owns
+        doc = await self.collection.find_one({"_id": wallet, "expires_at": {"$gt": datetime.utcnow()}})
+        if doc is None:
+            return None
+        self._stats["persisted_hits"] += 1
+        remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+        self._memory.set(wallet, doc["owns"], ttl=remaining)
+        return doc["owns"]
+
+    async def set(self, wallet, owns: bool, ttl=None):
+        """Remember a verdict, using the positive or negative TTL unless told otherwise."""
+        if ttl is None:
+            ttl = self.positive_ttl if owns else self.negative_ttl
+        self._memory.set(wallet, owns, ttl=ttl)
+        if self.collection is not None:
+            await self.collection.update_one(
+                {"_id": wallet},
+                {"$set": {"owns": owns, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)}},
+                upsert=True,
+            )
+
+    async def invalidate(self, wallet):
+        """Forget whatever we knew about this wallet, next check goes to the chain."""
+        self._memory.pop(wallet)
+        self._stats["invalidations"] += 1
+        if self.collection is not None:
+            await self.collection.delete_one({"_id": wallet})
+
+    def metrics(self) -> dict:
+        return {"memory": self._memory.metrics(), **self._stats}
@@ -0,0 +1,89 @@
+# Progress messages - one status message per job that gets edited as it moves along, instead of a new ping per stage.
+
+import asyncio
+import logging
+import time
+
+from streaming import EditableMessage
+
+logger = logging.getLogger("TelegramBotApp.progress")
+
+
+class ProgressMessage:
+    """A single Telegram message that follows a job through its stages.
+
+    set() is fire-and-forget: it records the latest stage and a background flusher catches the message up,
+    editing at most once per min_interval, so stages that come and go inside the window never cost a call.
+    Nothing is sent until the job has been running for show_after seconds - quick jobs finish before
+    anyone needs a status message, and finish() then leaves no trace at all.
+    """
+
+    def __init__(self, bot, chat_id, min_interval=3.0, show_after=1.0, priority=None):
+        self.bot = bot  # a Bot or the SendScheduler
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        # priority is passed through to the scheduler, None for a plain Bot
+        self._message = EditableMessage(bot, chat_id, **({"priority": priority} if priority is not None else {}))
+        self.skipped = 0  # stages that were overtaken before they were ever shown
+        self._wanted = None
+        self._show_at = time.monotonic() + show_after
+        self._hurry = asyncio.Event()
+        self._flusher = None
+
+    @property
+    def message_id(self):
+        return self._message.message_id
+
+    @property
+    def sends(self):
+        return self._message.sends
+
+    @property
+    def edits(self):
+        return self._message.edits
+
+    def set(self, text):
+        """Move to a new stage. Returns right away, the message catches up in the background."""
+        if self._wanted is not None and self._wanted != self._message.shown:
+            self.skipped += 1
+        self._wanted = text
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+
+    async def finish(self, text):
+        """Final stage: edit the message to text if one went out, otherwise stay silent."""
+        await self._settle(text, quiet=True)
+
+    async def fail(self, text):
+        """Final stage for errors: always shown, sending the message now if it hadn't gone out yet."""
+        await self._settle(text, quiet=False)
+
+    async def _settle(self, text, quiet):
+        self._wanted = None  # no new stages from here on, a send already in flight still lands
+        self._hurry.set()
+        if self._flusher is not None and not self._flusher.done():
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        if quiet and self.message_id is None:
+            return
+        try:
+            await self._message.show(text)
+        except Exception as e:
+            logger.warning(f"Couldn't post final progress in chat {self.chat_id}: {e}")
+
+    async def _flush(self):
+        try:
+            while self._wanted is not None and self._wanted != self._message.shown:
+                if self.message_id is None:
+                    delay = self._show_at - time.monotonic()
+                else:
+                    delay = self._message.last_shown_at + self.min_interval - time.monotonic()
+                if delay > 0 and not self._hurry.is_set():
+                    try:
+                        await asyncio.wait_for(self._hurry.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue  # the stage may have moved on (or been cancelled) while we waited
+                await self._message.show(self._wanted)
+        except Exception as e:
+            # Progress is a nicety - never let it take the job down with it
+            logger.warning(f"Couldn't update progress message in chat {self.chat_id}: {e}")
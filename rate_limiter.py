@@ -0,0 +1,79 @@
+# Token-bucket rate limiting - O(1) checks, lazy refill, no sleeper tasks, and idle users cost nothing.
+
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """One token bucket per key, refilled lazily from the clock whenever the key is checked.
+
+    Buckets are kept in least-recently-used order. A bucket untouched for capacity / rate seconds is
+    full again, which is the same as not existing, so those get evicted from the front as we go.
+    """
+
+    def __init__(self, rate_per_minute, burst=None, max_entries=100000, clock=time.monotonic):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.capacity = float(burst if burst is not None else rate_per_minute)
+        self.max_entries = max_entries
+        self.idle_seconds = self.capacity / self.rate
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._stats = {"allowed": 0, "limited": 0, "evicted": 0}
+
+    def _tokens(self, key, now):
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.capacity
+        tokens, updated_at = entry
+        return min(self.capacity, tokens + (now - updated_at) * self.rate)
+
+    def allow(self, key, cost=1.0) -> bool:
+        """Spend `cost` tokens for key if it has them."""
+        now = self._clock()
+        tokens = self._tokens(key, now)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+            self._stats["allowed"] += 1
+        else:
+            self._stats["limited"] += 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        self._evict(now)
+        return allowed
+
+    def retry_after(self, key, cost=1.0) -> float:
+        """Seconds until key can afford `cost` again."""
+        missing = cost - self._tokens(key, self._clock())
+        return max(0.0, missing / self.rate)
+
+    def _evict(self, now):
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_entries and now - updated_at < self.idle_seconds:
+                break
+            del self._buckets[key]
+            self._stats["evicted"] += 1
+
+    def metrics(self) -> dict:
+        return {"tracked_keys": len(self._buckets), **self._stats}
+
+
+class RateLimiter:
+    """Per-command-class limits (text vs image, ...) for each chat, stored in a pluggable shared-state backend."""
+
+    def __init__(self, backend, limits):
+        self.backend = backend  # InMemoryStateBackend or MongoStateBackend from shared_state
+        self.limits = dict(limits)  # command class -> (rate_per_minute, burst)
+        self._stats = {command_class: {"allowed": 0, "limited": 0} for command_class in self.limits}
+
+    async def allow(self, command_class, key) -> bool:
+        rate_per_minute, burst = self.limits[command_class]
+        allowed = await self.backend.take_token(command_class, key, rate_per_minute, burst)
+        self._stats[command_class]["allowed" if allowed else "limited"] += 1
+        return allowed
+
+    def metrics(self) -> dict:
+        return {"limits": self._stats, "backend": self.backend.metrics()}
@@ -0,0 +1,222 @@
+# Outbound send scheduler - every message to Telegram waits its turn, so we stop collecting 429s like Pokemon cards.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger("TelegramBotApp.sender")
+
+# Lower goes first - actual answers beat "working on it..." chatter
+PRIORITY_REPLY = 0
+PRIORITY_STATUS = 1
+
+
+class SendScheduler:
+    """Routes bot API calls through a global token bucket plus per-chat pacing, in priority order.
+
+    Telegram allows roughly 30 messages/s overall, 1/s per private chat and 20/min per group. Calls
+    wait in a priority heap; the dispatcher picks the best call whose chat is ready, spends a global
+    token and fires it off without waiting for the HTTP round-trip. A RetryAfter puts the chat on ice
+    for as long as Telegram asked and requeues the call.
+
+    The send_message / send_photo / edit_message_text methods mirror the Bot API, so anything that
+    takes a bot can be handed the scheduler instead.
+    """
+
+    def __init__(self, bot, global_rate=30.0, private_interval=1.0, group_interval=3.0, max_retries=3, clock=time.monotonic):
+        self.bot = bot
+        self.global_rate = global_rate
+        self.private_interval = private_interval
+        self.group_interval = group_interval
+        self.max_retries = max_retries
+        self._clock = clock
+        self._heap = []  # (priority, seq, job)
+        self._seq = itertools.count()
+        self._chat_ready_at = {}  # chat_id -> earliest time the next call may go out
+        self._tokens = global_rate
+        self._tokens_at = clock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._in_flight = set()
+        self._stats = {"sent": 0, "failed": 0, "retry_after": 0, "reserved": 0, "max_queue_depth": 0, "total_wait_seconds": 0.0}
+
+    async def start(self):
+        self._task = asyncio.create_task(self._dispatch())
+        logger.info(f"Send scheduler started ({self.global_rate}/s global, {self.private_interval}s per private chat, {self.group_interval}s per group).")
+
+    async def stop(self, drain_timeout=5.0):
+        """Let queued sends go out for a bit, then stop dispatching."""
+        deadline = self._clock() + drain_timeout
+        while (self._heap or self._in_flight) and self._clock() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for _, _, job in self._heap:
+            if not job["future"].done():
+                job["future"].set_exception(RuntimeError("Send scheduler stopped"))
+        self._heap = []
+
+    # Bot API look-alikes
+    async def send_message(self, chat_id, text, priority=PRIORITY_REPLY, **kwargs):
+        return await self.submit(chat_id, "send_message", priority, text=text, **kwargs)
+
+    async def send_photo(self, chat_id, photo, priority=PRIORITY_REPLY, **kwargs):
+        return await self.submit(chat_id, "send_photo", priority, photo=photo, **kwargs)
+
+    async def edit_message_text(self, chat_id, message_id, text, priority=PRIORITY_STATUS, **kwargs):
+        return await self.submit(chat_id, "edit_message_text", priority, message_id=message_id, text=text, **kwargs)
+
+    async def submit(self, chat_id, method, priority=PRIORITY_REPLY, **kwargs):
+        """Queue a bot API call for chat_id and wait for Telegram's answer."""
+        job = {
+            "chat_id": chat_id,
+            "method": method,
+            "kwargs": kwargs,
+            "future": asyncio.get_running_loop().create_future(),
+            "attempts": 0,
+            "queued_at": self._clock(),
+        }
+        self._push(priority, job)
+        return await job["future"]
+
+    def try_reserve(self, chat_id) -> bool:
+        """Claim a send slot for a call made outside the scheduler (e.g. a reply in the webhook response).
+
+        Only succeeds when nothing is queued for the chat, its pacing window has passed and a global
+        token is available right now - otherwise the caller should take the regular path.
+        """
+        now = self._clock()
+        if self._chat_ready_at.get(chat_id, 0.0) > now:
+            return False
+        if any(job["chat_id"] == chat_id for _, _, job in self._heap):
+            return False
+        if self._take_global_token(now) > 0:
+            return False
+        self._chat_ready_at[chat_id] = now + self.interval_for(chat_id)
+        self._stats["reserved"] += 1
+        return True
+
+    def _push(self, priority, job):
+        job["priority"] = priority
+        heapq.heappush(self._heap, (priority, next(self._seq), job))
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._heap))
+        self._wakeup.set()
+
+    def interval_for(self, chat_id):
+        """Minimum spacing between calls to this chat."""
+        # Groups and channels have negative ids in the Bot API
+        return self.group_interval if chat_id < 0 else self.private_interval
+
+    def _take_global_token(self, now):
+        """Spend a global token, or return how long until one is available."""
+        self._tokens = min(self.global_rate, self._tokens + (now - self._tokens_at) * self.global_rate)
+        self._tokens_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.global_rate
+
+    async def _dispatch(self):
+        while True:
+            try:
+                await self._dispatch_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # One bad job must not take every future send down with the dispatcher
+                logger.exception(f"Send dispatcher hiccup, carrying on: {e}")
+                await asyncio.sleep(0.1)
+
+    async def _dispatch_next(self):
+        """Send (or wait for) the next call. One pass of the dispatcher loop."""
+        if not self._heap:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+            return
+
+        now = self._clock()
+        # Best-priority call whose chat is ready; the ones we skip go back on the heap
+        skipped, job = [], None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if item[2]["future"].done():
+                continue  # caller gave up while it waited, don't spend a token on it
+            if self._chat_ready_at.get(item[2]["chat_id"], 0.0) <= now:
+                job = item[2]
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+
+        if job is None:
+            if not skipped:
+                return  # only abandoned calls were left, nothing to wait for
+            # Everyone's pacing - sleep until the first chat frees up or something new arrives
+            next_ready = min(self._chat_ready_at.get(item[2]["chat_id"], now) for item in skipped)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, next_ready - now))
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        wait = self._take_global_token(now)
+        if wait > 0:
+            heapq.heappush(self._heap, (job["priority"], next(self._seq), job))
+            await asyncio.sleep(wait)
+            return
+
+        self._chat_ready_at[job["chat_id"]] = now + self.interval_for(job["chat_id"])
+        self._prune_chats(now)
+        task = asyncio.create_task(self._execute(job))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    def _prune_chats(self, now):
+        # Chats whose pacing window has passed are indistinguishable from chats we've never seen
+        if len(self._chat_ready_at) > 10000:
+            self._chat_ready_at = {chat: ready for chat, ready in self._chat_ready_at.items() if ready > now}
+
+    async def _execute(self, job):
+        future = job["future"]
+        if future.cancelled():
+            return
+        job["attempts"] += 1
+        try:
+            result = await getattr(self.bot, job["method"])(chat_id=job["chat_id"], **job["kwargs"])
+        except RetryAfter as e:
+            self._stats["retry_after"] += 1
+            if job["attempts"] > self.max_retries:
+                self._stats["failed"] += 1
+                if not future.done():
+                    future.set_exception(e)
+                return
+            logger.warning(f"Telegram says slow down for chat {job['chat_id']}, retrying in {e.retry_after}s.")
+            self._chat_ready_at[job["chat_id"]] = self._clock() + e.retry_after
+            self._push(job["priority"], job)
+        except Exception as e:
+            self._stats["failed"] += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self._stats["sent"] += 1
+            self._stats["total_wait_seconds"] += self._clock() - job["queued_at"]
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self) -> dict:
+        sent = self._stats["sent"]
+        return {
+            "queued": len(self._heap),
+            "queued_replies": sum(1 for priority, _, _ in self._heap if priority == PRIORITY_REPLY),
+            "in_flight": len(self._in_flight),
+            "paced_chats": len(self._chat_ready_at),
+            "avg_wait_seconds": self._stats["total_wait_seconds"] / sent if sent else 0.0,
+            **{k: v for k, v in self._stats.items() if k != "total_wait_seconds"},
+        }
@@ -0,0 +1,115 @@
+# Shared state backends - rate limits and locks that hold across every uvicorn worker, not just this one.
+
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from rate_limiter import TokenBucketLimiter
+
+logger = logging.getLogger("TelegramBotApp.shared_state")
+
+
+class InMemoryStateBackend:
+    """Single-process backend - fine for one worker, and the fastest option by far."""
+
+    def __init__(self, max_entries=100000, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._limiters = {}  # bucket name -> TokenBucketLimiter
+        self._locks = {}  # lock name -> (token, expires_at)
+
+    async def ensure_indexes(self):
+        pass
+
+    async def take_token(self, bucket, key, rate_per_minute, burst, cost=1.0) -> bool:
+        limiter = self._limiters.get(bucket)
+        if limiter is None:
+            limiter = self._limiters[bucket] = TokenBucketLimiter(rate_per_minute, burst, max_entries=self.max_entries, clock=self._clock)
+        return limiter.allow(key, cost)
+
+    async def acquire_lock(self, name, ttl):
+        """Take the named lock for up to ttl seconds. Returns a release token, or None if someone else holds it."""
+        now = self._clock()
+        held = self._locks.get(name)
+        if held is not None and held[1] > now:
+            return None
+        token = uuid.uuid4().hex
+        self._locks[name] = (token, now + ttl)
+        return token
+
+    async def release_lock(self, name, token):
+        held = self._locks.get(name)
+        if held is not None and held[0] == token:
+            del self._locks[name]
+
+    def metrics(self) -> dict:
+        return {
+            "backend": "memory",
+            "locks_held": len(self._locks),
+            "buckets": {bucket: limiter.metrics() for bucket, limiter in self._limiters.items()},
+        }
+
+
+class MongoStateBackend:
+    """Multi-worker backend on Mongo - each check is one atomic find_one_and_update, no read-modify-write races."""
+
+    def __init__(self, buckets_collection, locks_collection):
+        self.buckets = buckets_collection
+        self.locks = locks_collection
+        self._stats = {"token_checks": 0, "lock_conflicts": 0}
+
+    async def ensure_indexes(self):
+        # Idle buckets and stale locks clean themselves up
+        await self.buckets.create_index("expires_at", expireAfterSeconds=0)
+        await self.locks.create_index("expires_at", expireAfterSeconds=0)
+
+    async def take_token(self, bucket, key, rate_per_minute, burst, cost=1.0) -> bool:
+        """Lazy-refill token bucket evaluated server-side with $$NOW, so every worker shares one clock and one bucket."""
+        rate_per_ms = rate_per_minute / 60000.0
+        capacity = float(burst if burst is not None else rate_per_minute)
+        idle_ms = int(capacity / rate_per_ms)  # after this long the bucket is full again, so it can expire
+        elapsed_ms = {"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}
+        pipeline = [
+            {"$set": {"tokens": {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_ms, rate_per_ms]}]}]}}},
+            {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                "updated_at": "$$NOW",
+                "expires_at": {"$add": ["$$NOW", idle_ms]},
+            }},
+        ]
+        self._stats["token_checks"] += 1
+        doc = await self.buckets.find_one_and_update(
+            {"_id": f"{bucket}:{key}"},
+            pipeline,
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"allowed": 1},
+        )
+        return bool(doc["allowed"])
+
+    async def acquire_lock(self, name, ttl):
+        """Take the named lock for up to ttl seconds. Returns a release token, or None if someone else holds it."""
+        token = uuid.uuid4().hex
+        now = datetime.utcnow()
+        try:
+            # Matches only a missing or expired lock; a live one makes the upsert collide on _id
+            await self.locks.update_one(
+                {"_id": name, "expires_at": {"$lte": now}},
+                {"$set": {"token": token, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            self._stats["lock_conflicts"] += 1
+            return None
+        return token
+
+    async def release_lock(self, name, token):
+        await self.locks.delete_one({"_id": name, "token": token})
+
+    def metrics(self) -> dict:
+        return {"backend": "mongo", **self._stats}
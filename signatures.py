@@ -0,0 +1,61 @@
+# Ed25519 signature checks - verify the wallet's signature directly, no mock transactions required.
+
+import logging
+from functools import lru_cache
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+from solana.publickey import PublicKey
+
+logger = logging.getLogger("TelegramBotApp.signatures")
+
+
+@lru_cache(maxsize=4096)
+def _load_public_key(wallet_address: str) -> Ed25519PublicKey:
+    """Base58 wallet address -> ready-to-use ed25519 key, cached since the same wallets sign over and over."""
+    return Ed25519PublicKey.from_public_bytes(bytes(PublicKey(wallet_address)))
+
+
+def verify_wallet_signature(wallet_address: str, message: bytes, signature: bytes) -> bool:
+    """True if `signature` is the wallet's ed25519 signature over `message`."""
+    try:
+        _load_public_key(wallet_address).verify(signature, message)
+        return True
+    except InvalidSignature:
+        return False
+    except ValueError as e:
+        # bad address or wrong-length key/signature
+        logger.warning(f"Can't verify signature for {wallet_address}: {e}")
+        return False
+
+
+def verify_batch(items) -> list:
+    """Verify many (wallet_address, message, signature) triples in one go, returning a bool per item.
+
+    Meant to be pushed to a worker thread as a single unit during verification bursts, sharing the
+    parsed-key cache across the whole batch.
+    """
+    return [verify_wallet_signature(wallet, message, signature) for wallet, message, signature in items]
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python signatures.py
+    import os
+    import timeit
+
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+    keys = [Ed25519PrivateKey.generate() for _ in range(100)]
+    items = []
+    for key in keys:
+        raw = key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        message = os.urandom(32)
+        items.append((str(PublicKey(raw)), message, key.sign(message)))
+
+    wallet, message, signature = items[0]
+    runs = 2000
+    single = timeit.timeit(lambda: verify_wallet_signature(wallet, message, signature), number=runs)
+    print(f"single verify:  {single / runs * 1e6:8.1f} us/op")
+    batch = timeit.timeit(lambda: verify_batch(items), number=runs // 100)
+    print(f"batch of {len(items)}:   {batch / (runs // 100) / len(items) * 1e6:8.1f} us/signature")
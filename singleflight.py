@@ -0,0 +1,37 @@
+# Single-flight - when the whole group chat asks the same thing at once, Grok only hears it once.
+
+import asyncio
+import logging
+
+logger = logging.getLogger("TelegramBotApp.singleflight")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight task whose result everyone shares."""
+
+    def __init__(self):
+        self._inflight = {}
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key, fn):
+        """Await fn() for key, or join the call already in flight for it."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._finish(key, t))
+            self._stats["calls"] += 1
+        else:
+            self._stats["coalesced"] += 1
+            logger.debug(f"Joining in-flight call for {key!r}, one less trip upstream.")
+        # Shielded so one impatient caller getting cancelled doesn't cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved, even if every waiter already left
+
+    def metrics(self) -> dict:
+        return {"in_flight": len(self._inflight), "upstream_calls": self._stats["calls"], "calls_saved": self._stats["coalesced"]}
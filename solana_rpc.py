@@ -0,0 +1,203 @@
+# Async Solana JSON-RPC - token gating checks ride the shared HTTP pool instead of blocking the loop on a fresh client.
+
+import asyncio
+import itertools
+import logging
+
+import httpx
+from solana.publickey import PublicKey
+from spl.token.instructions import get_associated_token_address
+
+logger = logging.getLogger("TelegramBotApp.solana")
+
+
+MAX_MULTIPLE_ACCOUNTS = 100  # getMultipleAccounts limit per call
+
+
+class SolanaRpcError(Exception):
+    """The RPC node answered, but with a JSON-RPC error."""
+
+
+class SolanaRpc:
+    """Minimal async JSON-RPC client for the handful of Solana calls the bot needs.
+
+    Requests go through the pooled "solana" client from the HttpClientRegistry, are capped at
+    max_concurrency in flight, and fail over to the next endpoint on transport errors, 429s and 5xxs.
+    """
+
+    def __init__(self, http_clients, endpoints, client_name="solana", max_concurrency=10, timeout=10.0, commitment="confirmed"):
+        if not endpoints:
+            raise ValueError("SolanaRpc needs at least one endpoint")
+        self.http_clients = http_clients
+        self.endpoints = list(endpoints)
+        self.client_name = client_name
+        self.timeout = timeout
+        self.commitment = commitment
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._ids = itertools.count(1)
+        self._current = 0  # index of the endpoint that last worked
+        self._stats = {"requests": 0, "failovers": 0, "errors": 0}
+
+    async def call(self, method, params):
+        """Run one JSON-RPC method and return its result."""
+        body = {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+        response = await self._post(body)
+        if "error" in response:
+            self._stats["errors"] += 1
+            raise SolanaRpcError(f"{method} failed: {response['error']}")
+        return response.get("result")
+
+    async def call_batch(self, calls):
+        """Run several (method, params) calls in one HTTP request, returning results or SolanaRpcErrors in order."""
+        if not calls:
+            return []
+        body = [
+            {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+            for method, params in calls
+        ]
+        responses = {response.get("id"): response for response in await self._post(body)}
+        results = []
+        for request in body:
+            response = responses.get(request["id"], {"error": "missing from batch response"})
+            if "error" in response:
+                self._stats["errors"] += 1
+                results.append(SolanaRpcError(f"{request['method']} failed: {response['error']}"))
+            else:
+                results.append(response.get("result"))
+        return results
+
+    async def _post(self, body):
+        client = self.http_clients.get(self.client_name)
+        last_error = None
+        async with self._semaphore:
+            for attempt in range(len(self.endpoints)):
+                index = (self._current + attempt) % len(self.endpoints)
+                endpoint = self.endpoints[index]
+                try:
+                    self._stats["requests"] += 1
+                    response = await client.post(endpoint, json=body, timeout=self.timeout)
+                    response.raise_for_status()
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 429 and e.response.status_code < 500:
+                        raise  # our request is bad, another node won't like it any better
+                    last_error = e
+                except httpx.TransportError as e:
+                    last_error = e
+                else:
+                    self._current = index
+                    return response.json()
+                self._stats["failovers"] += 1
+                logger.warning(f"Solana RPC endpoint {endpoint} failed ({last_error!r}), trying the next one.")
+        raise last_error
+
+    async def get_token_balance(self, owner, mint) -> int:
+        """Total raw amount of `mint` held across all of `owner`'s token accounts."""
+        result = await self.call("getTokenAccountsByOwner", [
+            owner,
+            {"mint": mint},
+            {"encoding": "jsonParsed", "commitment": self.commitment},
+        ])
+        return sum(
+            int(account["account"]["data"]["parsed"]["info"]["tokenAmount"]["amount"])
+            for account in (result or {}).get("value", [])
+        )
+
+    async def get_token_balances(self, owners, mint) -> dict:
+        """Balances of `mint` for many owners using as few requests as possible.
+
+        Most holders keep the token in their associated token account, so those are fetched with
+        getMultipleAccounts (100 per call). Owners without one - or with an empty one, since the
+        tokens may sit in another account - fall back to getTokenAccountsByOwner, sent together as
+        one JSON-RPC batch. Returns owner -> amount, or owner -> exception on failure.
+        """
+        owners = list(dict.fromkeys(owners))
+        mint_key = PublicKey(mint)
+        atas = {owner: str(get_associated_token_address(PublicKey(owner), mint_key)) for owner in owners}
+        balances = {}
+        leftovers = []
+        for start in range(0, len(owners), MAX_MULTIPLE_ACCOUNTS):
+            chunk = owners[start:start + MAX_MULTIPLE_ACCOUNTS]
+            result = await self.call("getMultipleAccounts", [
+                [atas[owner] for owner in chunk],
+                {"encoding": "jsonParsed", "commitment": self.commitment},
+            ])
+            for owner, account in zip(chunk, result["value"]):
+                amount = 0 if account is None else int(account["data"]["parsed"]["info"]["tokenAmount"]["amount"])
+                if amount > 0:
+                    balances[owner] = amount
+                else:
+                    leftovers.append(owner)  # no ATA or an empty one, the full account list has the final say
+
+        results = await self.call_batch([
+            ("getTokenAccountsByOwner", [owner, {"mint": mint}, {"encoding": "jsonParsed", "commitment": self.commitment}])
+            for owner in leftovers
+        ])
+        for owner, result in zip(leftovers, results):
+            if isinstance(result, Exception):
+                balances[owner] = result
+            else:
+                balances[owner] = sum(
+                    int(account["account"]["data"]["parsed"]["info"]["tokenAmount"]["amount"])
+                    for account in (result or {}).get("value", [])
+                )
+        return balances
+
+    def metrics(self) -> dict:
+        return {"endpoint": self.endpoints[self._current], **self._stats}
+
+
+class BalanceBatcher:
+    """Collects balance lookups for a few milliseconds and resolves them with one batched RPC round."""
+
+    def __init__(self, rpc, mint, window=0.005, max_batch=MAX_MULTIPLE_ACCOUNTS):
+        self.rpc = rpc
+        self.mint = mint
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}  # owner -> future, same owner twice in a window shares one lookup
+        self._timer = None
+        self._in_flight = set()  # strong refs so running batches can't be garbage-collected
+        self._stats = {"lookups": 0, "batches": 0, "largest_batch": 0}
+
+    async def get_balance(self, owner) -> int:
+        """Token balance for one owner, fetched alongside whoever else asked in the same window."""
+        self._stats["lookups"] += 1
+        future = self._pending.get(owner)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())  # no "never retrieved" noise if every waiter left
+            self._pending[owner] = future
+            if len(self._pending) >= self.max_batch:
+                self._flush_now()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+        return await asyncio.shield(future)
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._resolve(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _resolve(self, batch):
+        self._stats["batches"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        try:
+            balances = await self.rpc.get_token_balances(list(batch), self.mint)
+        except Exception as e:
+            balances = {owner: e for owner in batch}
+        for owner, future in batch.items():
+            if future.done():
+                continue
+            result = balances.get(owner, SolanaRpcError(f"No balance returned for {owner}"))
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def metrics(self) -> dict:
+        return dict(self._stats)
@@ -0,0 +1,132 @@
+# Streaming replies - show Grok's answer as it types instead of making everyone stare at "typing..." for ages.
+
+import asyncio
+import json
+import logging
+import time
+
+from telegram.error import BadRequest
+
+logger = logging.getLogger("TelegramBotApp.streaming")
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+
+async def iter_sse_deltas(response):
+    """Yield the content deltas from an OpenAI-style chat completion SSE stream."""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue  # blank keep-alives, comments, event names
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            logger.warning(f"Skipping unparseable stream chunk: {data[:200]}")
+            continue
+        for choice in chunk.get("choices", []):
+            delta = choice.get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+class EditableMessage:
+    """A message that's sent once and then edited in place - the bookkeeping every live-updating reply shares.
+
+    Extra send_kwargs (e.g. a scheduler priority) ride along on every send and edit.
+    """
+
+    def __init__(self, bot, chat_id, **send_kwargs):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.send_kwargs = send_kwargs
+        self.message_id = None
+        self.shown = None
+        self.last_shown_at = 0.0
+        self.sends = 0
+        self.edits = 0
+
+    async def show(self, text):
+        """Send text, or edit the message to it. A "not modified" answer counts as done."""
+        text = text[:TELEGRAM_MAX_MESSAGE_LENGTH]
+        if text == self.shown:
+            return
+        if self.message_id is None:
+            sent = await self.bot.send_message(chat_id=self.chat_id, text=text, **self.send_kwargs)
+            self.message_id = sent.message_id
+            self.sends += 1
+        else:
+            try:
+                await self.bot.edit_message_text(chat_id=self.chat_id, message_id=self.message_id, text=text, **self.send_kwargs)
+                self.edits += 1
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+        # Stamped once Telegram has it, so time spent waiting on pacing doesn't count as spacing
+        self.last_shown_at = time.monotonic()
+        self.shown = text
+
+
+class StreamingReply:
+    """One Telegram message that grows as deltas arrive, edited at most once per min_interval.
+
+    push() only records the text; a background flusher does the sends/edits, so a slow or paced edit
+    never holds up reading the upstream stream. Deltas that arrive while an edit is in flight simply
+    land in the next one.
+    """
+
+    def __init__(self, bot, chat_id, min_interval=1.0, cursor=" ▌"):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.cursor = cursor
+        self.text = ""
+        self._message = EditableMessage(bot, chat_id)
+        self._hurry = asyncio.Event()
+        self._finishing = False
+        self._flusher = None
+
+    @property
+    def message_id(self):
+        return self._message.message_id
+
+    @property
+    def edits(self):
+        return self._message.edits
+
+    async def push(self, delta):
+        """Append a delta; the message catches up in the background."""
+        self.text += delta
+        if not self._finishing and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.create_task(self._flush())
+
+    async def finish(self, final_text=None):
+        """Render the final answer, spilling anything past Telegram's length limit into follow-up messages."""
+        self._finishing = True
+        self._hurry.set()
+        if self._flusher is not None and not self._flusher.done():
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        if final_text is not None:
+            self.text = final_text
+        text = self.text or "..."
+        head, tail = text[:TELEGRAM_MAX_MESSAGE_LENGTH], text[TELEGRAM_MAX_MESSAGE_LENGTH:]
+        await self._message.show(head)
+        while tail:
+            chunk, tail = tail[:TELEGRAM_MAX_MESSAGE_LENGTH], tail[TELEGRAM_MAX_MESSAGE_LENGTH:]
+            await self.bot.send_message(chat_id=self.chat_id, text=chunk)
+
+    async def _flush(self):
+        try:
+            while not self._finishing and (self.text + self.cursor)[:TELEGRAM_MAX_MESSAGE_LENGTH] != self._message.shown:
+                delay = self._message.last_shown_at + self.min_interval - time.monotonic()
+                if delay > 0 and self.message_id is not None:
+                    try:
+                        await asyncio.wait_for(self._hurry.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._message.show(self.text + self.cursor)
+        except Exception as e:
+            # The final edit in finish() gets another go, no need to break the stream over it
+            logger.warning(f"Couldn't update streaming reply in chat {self.chat_id}: {e}")
@@ -0,0 +1,89 @@
+# In-process TTL + LRU cache - the hot stuff never has to leave the building.
+
+import sys
+import time
+from collections import OrderedDict
+
+
+def _estimate_size(key, value) -> int:
+    """Rough byte cost of an entry, good enough to keep memory in check."""
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(key, tuple):
+        # getsizeof on a tuple only counts its header and pointers, not the strings it holds
+        size += sum(sys.getsizeof(part) for part in key)
+    return size
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a TTL.
+
+    Capped by entry count and by estimated bytes. Expired entries are dropped when touched; when a cap
+    is hit, entries go in least-recently-used order, so eviction is always LRU regardless of TTL.
+    """
+
+    def __init__(self, maxsize=10000, max_bytes=64 * 1024 * 1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self._clock()
+
+    def get(self, key, default=None):
+        """Return a live value and mark it recently used, or default on miss/expiry."""
+        entry = self._data.get(key)
+        if entry is None:
+            self._stats["misses"] += 1
+            return default
+        if entry[0] <= self._clock():
+            self._drop(key)
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return default
+        self._data.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Store a value, optionally with its own TTL, evicting LRU entries to stay within the caps."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        if key in self._data:
+            self._drop(key)
+        size = _estimate_size(key, value)
+        if size > self.max_bytes:
+            return  # too chonky to ever fit, don't flush the whole cache for it
+        self._data[key] = (self._clock() + ttl, value, size)
+        self._bytes += size
+        while len(self._data) > self.maxsize or self._bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._drop(oldest)
+            self._stats["evictions"] += 1
+
+    def pop(self, key, default=None):
+        """Remove a key, returning its value if it was still live."""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        self._drop(key)
+        return entry[1] if entry[0] > self._clock() else default
+
+    def clear(self):
+        self._data.clear()
+        self._bytes = 0
+
+    def _drop(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._data), "bytes": self._bytes, **self._stats}
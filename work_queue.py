@@ -0,0 +1,125 @@
+# Background work queue - the webhook drops updates in here and bounces, the consumers do the heavy lifting.
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("TelegramBotApp.queue")
+
+# What to do when the queue is full
+FULL_POLICY_REJECT = "reject"  # refuse right away, the webhook answers 503 and Telegram redelivers later
+FULL_POLICY_WAIT = "wait"  # wait up to put_timeout for a slot, then refuse
+FULL_POLICY_DROP = "drop"  # refuse right away, the webhook still answers 200 so the update is gone
+FULL_POLICIES = (FULL_POLICY_REJECT, FULL_POLICY_WAIT, FULL_POLICY_DROP)
+
+
+class UpdateWorkQueue:
+    """Bounded asyncio queue drained by a fixed pool of consumer tasks."""
+
+    def __init__(self, maxsize=1000, workers=8, full_policy=FULL_POLICY_REJECT, put_timeout=1.0, lanes=None):
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(f"Unknown queue full policy '{full_policy}', pick one of {FULL_POLICIES}")
+        self.maxsize = maxsize
+        self.workers = workers
+        self.full_policy = full_policy
+        self.put_timeout = put_timeout
+        self.lanes = lanes  # optional ChatLaneScheduler, keeps keyed jobs in order
+        self._queue = None
+        self._tasks = []
+        self._busy = 0
+        self._pending_keys = {}  # key -> jobs submitted but not finished yet
+        self._stats = {
+            "enqueued": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "max_depth": 0,
+            "total_wait_seconds": 0.0,
+        }
+
+    async def start(self):
+        """Spin up the consumer pool."""
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._consume(i)) for i in range(self.workers)]
+        logger.info(f"Work queue started with {self.workers} consumers (maxsize={self.maxsize}, full_policy={self.full_policy}).")
+
+    async def stop(self, drain_timeout=10.0):
+        """Give queued work a chance to finish, then cancel the consumers."""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Work queue still had {self._queue.qsize()} jobs after {drain_timeout}s, dropping them. RIP.")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Work queue stopped.")
+
+    async def submit(self, job, key=None) -> bool:
+        """Queue a zero-arg coroutine function. Jobs sharing a key run in submission order when lanes are configured.
+
+        Returns False when the queue is full and the job was refused.
+        """
+        item = (time.monotonic(), key, job)
+        try:
+            if self.full_policy == FULL_POLICY_WAIT:
+                await asyncio.wait_for(self._queue.put(item), timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except (asyncio.QueueFull, asyncio.TimeoutError):
+            self._stats["rejected"] += 1
+            logger.warning(f"Work queue full ({self._queue.qsize()}/{self.maxsize}), refusing job. Too much sauce!")
+            return False
+        if key is not None:
+            self._pending_keys[key] = self._pending_keys.get(key, 0) + 1
+        self._stats["enqueued"] += 1
+        self._stats["max_depth"] = max(self._stats["max_depth"], self._queue.qsize())
+        return True
+
+    async def _consume(self, worker_id):
+        while True:
+            enqueued_at, key, job = await self._queue.get()
+            self._busy += 1
+            self._stats["total_wait_seconds"] += time.monotonic() - enqueued_at
+            try:
+                if self.lanes is not None and key is not None:
+                    await self.lanes.run(key, job)
+                else:
+                    await job()
+                self._stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.exception(f"Consumer {worker_id} failed processing a job: {e}")
+            finally:
+                self._busy -= 1
+                if key is not None:
+                    self._done_with(key)
+                self._queue.task_done()
+
+    def _done_with(self, key):
+        remaining = self._pending_keys.get(key, 1) - 1
+        if remaining > 0:
+            self._pending_keys[key] = remaining
+        else:
+            self._pending_keys.pop(key, None)
+
+    def is_idle(self, key) -> bool:
+        """True when no job for this key is queued or running."""
+        return key not in self._pending_keys
+
+    def metrics(self) -> dict:
+        """Snapshot of queue depth and throughput counters."""
+        started = self._stats["processed"] + self._stats["failed"] + self._busy
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "full_policy": self.full_policy,
+            "avg_wait_seconds": self._stats["total_wait_seconds"] / started if started else 0.0,
+            **{k: v for k, v in self._stats.items() if k != "total_wait_seconds"},
+        }